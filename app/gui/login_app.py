@@ -1,21 +1,18 @@
 import asyncio
 import os
+import queue
 import threading
 import tkinter as tk
-from asyncio import CancelledError
 from tkinter import messagebox, simpledialog
 from PIL import Image, ImageTk, ImageDraw, ImageFont
-from telethon.errors import SessionPasswordNeededError
 
-from docx import Document
-from docx.shared import Pt, RGBColor
-from telethon.tl.types import MessageService
-
-from app.utils.constants import AVATAR_SIZE, SESSIONS_DIR, IMAGES_DIR
+# Telethon, python-docx и сервисы на их основе импортируются внутри методов,
+# чтобы окно выбора аккаунта появлялось до их загрузки
+from app.utils.constants import SESSIONS_DIR, DOWNLOADS_DIR, LARGE_MEDIA_THRESHOLD
 from app.utils.file_utils import load_meta, save_meta
 from app.utils.image_utils import make_rounded_avatar, generate_letter_avatar
 from app.telegram_client.client_manager import TelegramClientManager
-from app.services.session_service import remove_session
+from app.services.session_service import remove_session, check_session, update_session_meta, avatar_is_stale
 
 
 class TelegramLoginApp:
@@ -41,6 +38,17 @@ class TelegramLoginApp:
         self.selected_dialog = None
         self.selected_dialog_id = None
         self.dialog_labels = []
+        self.entity_cache = None
+        self.live_archive = None
+        self.current_session = None
+        self.session_checks = {}
+        self.deferred_actions = {}
+        self.session_rows = {}
+        self.search_index = None
+        self.search_available = True
+
+        # Поток event loop — демон, поэтому буфер live-архива сбрасываем явно при закрытии
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         self.show_session_selector()
 
@@ -48,18 +56,42 @@ class TelegramLoginApp:
         asyncio.set_event_loop(self.loop)
         self.loop.run_forever()
 
+    def on_close(self):
+        try:
+            self.disconnect_client()
+        except Exception as e:
+            print(f"⚠️ Error while closing: {e}")
+        finally:
+            self.root.destroy()
+
     # -------------------- Helpers --------------------
     def clear_window(self):
         for widget in self.root.winfo_children():
             widget.destroy()
 
     def disconnect_client(self):
+        if self.live_archive:
+            asyncio.run_coroutine_threadsafe(self.live_archive.stop(), self.loop).result()
+            self.live_archive = None
         if self.client_manager:
             self.client_manager.disconnect()
+        self.current_session = None
 
-    def get_account_image(self, session_name, display_name):
-        meta = load_meta()
-        info = meta.get(session_name + ".session", {})
+    def get_search_index(self):
+        """Индекс открывается при первом поиске/экспорте; без FTS5 поиск отключается"""
+        if self.search_index is None and self.search_available:
+            import sqlite3
+            from app.services.search_index import SearchIndex
+
+            try:
+                self.search_index = SearchIndex()
+            except sqlite3.OperationalError as e:
+                print(f"⚠️ Search index unavailable: {e}")
+                # Нет FTS5 в сборке SQLite — больше не пытаемся; иначе попробуем в следующий раз
+                self.search_available = "fts5" not in str(e).lower()
+        return self.search_index
+
+    def get_account_image(self, info, display_name):
         avatar_path = info.get("avatar")
 
         if avatar_path and os.path.exists(avatar_path):
@@ -82,31 +114,125 @@ class TelegramLoginApp:
             for s in sessions:
                 info = meta.get(s + ".session", {})
                 display_name = info.get("display_name", s)
-                img = self.get_account_image(s, display_name)
+                img = self.get_account_image(info, display_name)
 
                 frame = tk.Frame(self.root)
                 frame.pack(pady=5, fill=tk.X, padx=10)
 
-                if img:
-                    lbl_img = tk.Label(frame, image=img)
-                    lbl_img.image = img
-                    lbl_img.pack(side=tk.LEFT, padx=5)
+                lbl_img = tk.Label(frame, image=img)
+                lbl_img.image = img
+                lbl_img.pack(side=tk.LEFT, padx=5)
 
                 tk.Button(frame, text=display_name, width=15,
                           command=lambda name=s: self.login_with_existing(name)).pack(side=tk.LEFT)
                 tk.Button(frame, text="Remove", fg="red",
                           command=lambda name=s: self.remove_account(name)).pack(side=tk.LEFT, padx=5)
+
+                lbl_status = tk.Label(frame, text="…", fg="gray")
+                lbl_status.pack(side=tk.LEFT, padx=5)
+                self.session_rows[s] = (lbl_img, lbl_status, display_name)
         else:
             tk.Label(self.root, text="No saved accounts found.").pack(pady=10)
 
         tk.Button(self.root, text="+ Add New Account", command=self.create_api_form).pack(pady=20)
 
+        # Окно уже нарисовано из meta.json, проверки идут в фоне
+        self.start_session_checks(sessions, meta)
+
+    def start_session_checks(self, sessions, meta):
+        results = queue.Queue()
+        pending = 0
+
+        for s in sessions:
+            info = meta.get(s + ".session")
+            if not info:
+                continue
+            if s == self.current_session:
+                # Сессия уже открыта основным клиентом — второй раз файл не трогаем
+                self.update_session_row(s, {"status": "ok", "avatar": info.get("avatar")})
+                continue
+
+            running = self.session_checks.get(s)
+            if running is not None and not running.done():
+                # Проверка с прошлой отрисовки ещё держит файл сессии; её poll обновит
+                # строку через self.session_rows, которая уже указывает на новые виджеты
+                continue
+
+            future = asyncio.run_coroutine_threadsafe(check_session(s, info, self.loop), self.loop)
+            future.add_done_callback(lambda f, name=s: results.put((name, f)))
+            self.session_checks[s] = future
+            pending += 1
+
+        if pending:
+            self.root.after(100, self.poll_session_checks, results, pending)
+
+    def poll_session_checks(self, results, pending):
+        # Tkinter не потокобезопасен, поэтому результаты забираем из очереди в GUI-потоке
+        while not results.empty():
+            name, future = results.get_nowait()
+            pending -= 1
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"status": "offline", "error": str(e)}
+            update_session_meta(name, result)
+            self.update_session_row(name, result)
+
+            action = self.deferred_actions.pop(name, None)
+            if action:
+                action()
+
+        if pending:
+            self.root.after(100, self.poll_session_checks, results, pending)
+
+    def update_session_row(self, session_name, result):
+        row = self.session_rows.get(session_name)
+        if not row or not row[1].winfo_exists():
+            return
+
+        lbl_img, lbl_status, display_name = row
+        if result["status"] == "ok":
+            lbl_status.config(text="✔", fg="green")
+            img = self.get_account_image(result, display_name)
+            lbl_img.config(image=img)
+            lbl_img.image = img
+        elif result["status"] == "unauthorized":
+            lbl_status.config(text="🔒 Login required", fg="orange")
+        else:
+            lbl_status.config(text="⚠ Offline", fg="red")
+
+    def defer_until_checked(self, session_name, status_text, action):
+        """Отложить действие до конца фоновой проверки сессии, не блокируя окно"""
+        check = self.session_checks.get(session_name)
+        if check is None or check.done():
+            return False
+
+        row = self.session_rows.get(session_name)
+        if row and row[1].winfo_exists():
+            row[1].config(text=status_text, fg="gray")
+        self.deferred_actions[session_name] = action
+        return True
+
     def remove_account(self, session_name):
         if messagebox.askyesno("Confirm", f"Remove account '{session_name}'?"):
+            # Пока проверка держит файл сессии открытым, удалить его нельзя (Windows)
+            def resume_remove():
+                # Пользователь мог уйти со списка аккаунтов (например, войти в другой)
+                row = self.session_rows.get(session_name)
+                if row and row[1].winfo_exists():
+                    self.finish_remove_account(session_name)
+
+            if self.defer_until_checked(session_name, "⏳ Removing…", resume_remove):
+                return
+            self.finish_remove_account(session_name)
+
+    def finish_remove_account(self, session_name):
+        self.session_checks.pop(session_name, None)
+        if session_name == self.current_session:
             self.disconnect_client()
-            remove_session(session_name)
-            messagebox.showinfo("Removed", f"Account '{session_name}' removed.")
-            self.show_session_selector()
+        remove_session(session_name)
+        messagebox.showinfo("Removed", f"Account '{session_name}' removed.")
+        self.show_session_selector()
 
     # -------------------- Existing Account Login --------------------
     def login_with_existing(self, session_name):
@@ -117,11 +243,34 @@ class TelegramLoginApp:
             messagebox.showerror("Error", "API credentials for this account are missing.")
             return
 
+        # Дожидаемся фоновой проверки, чтобы не открывать файл сессии дважды
+        def resume_login():
+            row = self.session_rows.get(session_name)
+            if row and row[1].winfo_exists():
+                self.login_with_existing(session_name)
+
+        if self.defer_until_checked(session_name, "⏳ Checking…", resume_login):
+            return
+
+        check = self.session_checks.pop(session_name, None)
+        status = None
+        if check:
+            try:
+                status = check.result()["status"]
+            except Exception:
+                pass
+
+        if status == "unauthorized":
+            messagebox.showerror("Error", "Session not authorized. Please log in again.")
+            self.create_api_form()
+            return
+
         try:
             self.disconnect_client()
             self.client = self.client_manager.connect(session_name, info["api_id"], info["api_hash"])
+            self.current_session = session_name
 
-            if self.client_manager.is_authorized():
+            if status == "ok" or self.client_manager.is_authorized():
                 self.check_and_update_avatar(session_name)
                 self.show_success()
             else:
@@ -205,6 +354,8 @@ class TelegramLoginApp:
         tk.Button(button_frame, text="Verify Code", command=self.verify_code).pack(side=tk.LEFT, padx=5)
 
     def verify_code(self):
+        from telethon.errors import SessionPasswordNeededError
+
         phone = self.phone.get().strip()
         code = self.code.get().strip()
         try:
@@ -243,30 +394,31 @@ class TelegramLoginApp:
 
         self.disconnect_client()
         self.client = self.client_manager.connect(safe_name, int(self.api_id.get()), self.api_hash.get())
+        self.current_session = safe_name
         self.check_and_update_avatar(safe_name)
 
     def check_and_update_avatar(self, session_name):
         me = self.client_manager.get_me()
         safe_name = session_name
-        photo_path = None
+        meta = load_meta()
+        info = meta.get(safe_name + ".session", {})
+        photo_id = getattr(me.photo, "photo_id", None)
+        photo_path = info.get("avatar")
 
         try:
-            if me.photo:
+            if photo_id is None:
+                photo_path = None
+                old_photo = info.get("avatar")
+                if old_photo and os.path.exists(old_photo):
+                    os.remove(old_photo)
+            elif avatar_is_stale(info, photo_id):
                 filename = f"{safe_name}.png"
                 photo_path = self.client_manager.download_avatar(me, filename)
-            else:
-                meta = load_meta()
-                info = meta.get(safe_name + ".session")
-                if info:
-                    old_photo = info.get("avatar")
-                    if old_photo and os.path.exists(old_photo):
-                        os.remove(old_photo)
         except:
-            pass
+            photo_id = info.get("photo_id")
 
-        meta = load_meta()
-        info = meta.get(safe_name + ".session", {})
         info["avatar"] = photo_path
+        info["photo_id"] = photo_id
         meta[safe_name + ".session"] = info
         save_meta(meta)
 
@@ -275,9 +427,60 @@ class TelegramLoginApp:
             self.client_manager.send_message("me", "Hello from Tkinter GUI!")
             messagebox.showinfo("Message Sent", "Message sent to Saved Messages.")
 
+    # -------------------- Search --------------------
+    def show_search_window(self):
+        search_index = self.get_search_index()
+        if search_index is None:
+            messagebox.showerror("Search", "Search is unavailable: SQLite was built without FTS5.")
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title("Search archived chats")
+        window.geometry("600x450")
+
+        query = tk.StringVar()
+        entry = tk.Entry(window, textvariable=query)
+        entry.pack(fill="x", padx=10, pady=10)
+        entry.focus_set()
+
+        results = tk.Listbox(window, height=12)
+        results.pack(fill="both", expand=True, padx=10)
+
+        context_text = tk.Text(window, height=8, wrap="word", state="disabled", bg="#f7f7f7")
+        context_text.pack(fill="x", padx=10, pady=10)
+
+        hits = []
+
+        def run_search(*_):
+            hits[:] = search_index.search(query.get())
+            results.delete(0, tk.END)
+            for hit in hits:
+                results.insert(
+                    tk.END,
+                    f"{(hit['date'] or '')[:16]}  {hit['dialog_name'] or hit['dialog_id']} — {hit['sender']}: {hit['snippet']}"
+                )
+
+        def show_context(_):
+            if not results.curselection():
+                return
+            hit = hits[results.curselection()[0]]
+            lines = [
+                f"{'▶ ' if message_id == hit['message_id'] else '  '}{sender}: {text}"
+                for message_id, sender, date, text in search_index.context(
+                    hit["account"], hit["dialog_id"], hit["message_id"]
+                )
+            ]
+            context_text.config(state="normal")
+            context_text.delete("1.0", tk.END)
+            context_text.insert(tk.END, f"{hit['account']} / {hit['dialog_name']}\n" + "\n".join(lines))
+            context_text.config(state="disabled")
+
+        query.trace_add("write", run_search)
+        results.bind("<<ListboxSelect>>", show_context)
+
     def show_success(self):
-        import os
-        from PIL import Image, ImageTk, ImageDraw, ImageFont
+        from app.services.entity_cache import EntityCache
+        from app.services.live_archive import LiveArchive
 
         def generate_placeholder_avatar(letter):
             img = Image.new("RGB", (40, 40), color="#cccccc")
@@ -299,10 +502,14 @@ class TelegramLoginApp:
         self.clear_window()
         me = self.client_manager.get_me()
 
+        # Ключ — имя файла сессии, а не текущий username: он может смениться,
+        # а по этому имени чистятся кэш, аватарки и live-архив
         meta = load_meta()
-        session_name = me.username or me.first_name or str(me.phone)
-        safe_name = session_name.replace(" ", "_").replace("@", "")
-        avatar_path = meta.get(safe_name + ".session", {}).get("avatar")
+        avatar_path = meta.get(self.current_session + ".session", {}).get("avatar")
+        self.entity_cache = EntityCache(self.current_session)
+        if self.live_archive is None:
+            self.live_archive = LiveArchive(self.current_session, search_index=self.get_search_index())
+        self.live_archive.entity_cache = self.entity_cache
 
         main_frame = tk.Frame(self.root)
         main_frame.pack(fill="both", expand=True)
@@ -327,17 +534,21 @@ class TelegramLoginApp:
         tk.Label(sidebar, text=f"📱 {me.phone}", bg="#f0f0f0").pack(pady=2)
 
         tk.Button(sidebar, text="📤 Send Test Message", command=self.send_test_message).pack(pady=15, fill="x", padx=10)
+        tk.Button(sidebar, text="🔍 Search Archive", command=self.show_search_window).pack(pady=5, fill="x", padx=10)
         tk.Button(sidebar, text="⬅️ Back to Accounts", command=self.show_session_selector).pack(pady=5, fill="x",
                                                                                                 padx=10)
 
-        import asyncio
-
         future = asyncio.run_coroutine_threadsafe(
             self.client_manager.get_dialogs(None),
             self.loop
         )
         dialogs = future.result()
 
+        # Диалоги приходят вместе с сущностями — сразу кладём их в кэш
+        for d in dialogs:
+            self.entity_cache.add(d.entity)
+        self.entity_cache.save()
+
         dialogs_frame = tk.Frame(main_frame, bg="white")
         dialogs_frame.pack(side="right", fill="both", expand=True)
 
@@ -382,12 +593,13 @@ class TelegramLoginApp:
             print("Selected dialog ID:", dialog_id)
 
             self.export_controls.pack(fill="x", padx=10, pady=(0, 10))
-
+            live_btn.config(text="⏹ Stop Live" if dialog_id in self.live_archive.dialog_ids else "🔴 Live")
 
         for d in dialogs:
             print(d)
 
-            first_letter = (d.name[0].upper() if d.name else "?")
+            dialog_name = self.entity_cache.name(d.id, d.name)
+            first_letter = (dialog_name[0].upper() if dialog_name else "?")
             avatar_img = generate_placeholder_avatar(first_letter)
             avatar_photo = ImageTk.PhotoImage(avatar_img)
 
@@ -400,7 +612,7 @@ class TelegramLoginApp:
 
             lbl = tk.Label(
                 dialog_frame,
-                text=f"{d.name}",
+                text=f"{dialog_name}",
                 bg=DIALOG_BG,
                 anchor="w",
                 font=("Arial", 11),
@@ -428,6 +640,14 @@ class TelegramLoginApp:
         count_entry.insert(0, "50")
         count_entry.pack(side="left", padx=5)
 
+        self.embed_large_media = tk.BooleanVar(value=True)
+        tk.Checkbutton(
+            self.export_controls,
+            text="Large media",
+            variable=self.embed_large_media,
+            bg="#eef5ff"
+        ).pack(side="left", padx=5)
+
         export_word_btn = tk.Button(
             self.export_controls,
             text="📄 Export to Word",
@@ -443,15 +663,56 @@ class TelegramLoginApp:
             )
         )
         export_word_btn.pack(side="left", padx=10)
-        import asyncio
+
+        export_archive_btn = tk.Button(
+            self.export_controls,
+            text="📦 Export Archive",
+            command=lambda: self.export_chat_to_archive(self.selected_dialog, int(count_entry.get()))
+        )
+        export_archive_btn.pack(side="left", padx=5)
+
+        def toggle_live():
+            if not self.live_archive.running:
+                asyncio.run_coroutine_threadsafe(
+                    self.live_archive.start(self.client_manager.client), self.loop
+                ).result()
+
+            if self.selected_dialog_id in self.live_archive.dialog_ids:
+                self.live_archive.unwatch(self.selected_dialog_id)
+                live_btn.config(text="🔴 Live")
+            else:
+                self.live_archive.watch(self.selected_dialog_id)
+                live_btn.config(text="⏹ Stop Live")
+
+        live_btn = tk.Button(self.export_controls, text="🔴 Live", command=toggle_live)
+        live_btn.pack(side="left", padx=5)
+
+    def export_chat_to_archive(self, dialog, limit):
+        from app.services.archive_export import export_dialog_archive
+
+        try:
+            file_path = asyncio.run_coroutine_threadsafe(
+                export_dialog_archive(
+                    self.client_manager.client,
+                    dialog,
+                    limit,
+                    self.current_session,
+                    self.entity_cache,
+                    search_index=self.get_search_index(),
+                    include_large_media=self.embed_large_media.get(),
+                ),
+                self.loop,
+            ).result()
+            print(f"✅ Exported archive: {file_path}")
+        except Exception as e:
+            messagebox.showerror("Export Error", str(e))
 
     def export_chat_to_docx(self, dialog, messages):
         from docx import Document
         from docx.shared import Pt, Inches, RGBColor, Cm
         from docx.enum.text import WD_ALIGN_PARAGRAPH
-        import asyncio, os
-        from PIL import Image
-        from pyrogram.enums import MessageMediaType
+        from telethon.tl.types import MessageService
+        from app.services.media_downloader import download_media_chunked
 
         doc = Document()
 
@@ -462,36 +723,39 @@ class TelegramLoginApp:
             section.left_margin = Cm(.25)
             section.right_margin = Cm(.25)
 
-        me = asyncio.run_coroutine_threadsafe(
-            self.client_manager.client.get_me(), self.loop
+        me = self.client_manager.get_me()
+        client = self.client_manager.client
+
+        # Все отправители резолвятся заранее пачками, а не по одному на сообщение
+        asyncio.run_coroutine_threadsafe(
+            self.entity_cache.resolve_senders(client, messages), self.loop
         ).result()
 
         temp_dir = "temp_dialog_photos"
         os.makedirs(temp_dir, exist_ok=True)
 
         last_sender_id = None
+        index_rows = []
 
         for msg in reversed(messages):
-            sender = getattr(msg.sender, "first_name", "Unknown")
+            sender = self.entity_cache.name(msg.sender_id)
             text = msg.message or ""
             time_str = msg.date.strftime("%Y-%m-%d %H:%M")
             is_me = (msg.sender_id == me.id)
 
+            if text.strip():
+                index_rows.append((msg.id, sender, msg.date.isoformat(), text))
+
             # Аватарка один раз при смене отправителя
             if msg.sender_id != last_sender_id:
                 avatar_path = None
-                if msg.sender and msg.sender.photo:
-                    try:
-                        avatar_path = os.path.join(temp_dir, f"{msg.sender_id}.jpg")
-                        if not os.path.exists(avatar_path):
-                            asyncio.run_coroutine_threadsafe(
-                                self.client_manager.client.download_profile_photo(
-                                    msg.sender_id, file=avatar_path
-                                ),
-                                self.loop,
-                            ).result()
-                    except Exception as e:
-                        print(f"⚠️ Could not download photo for {sender}: {e}")
+                try:
+                    avatar_path = asyncio.run_coroutine_threadsafe(
+                        self.entity_cache.download_avatar(client, msg.sender_id),
+                        self.loop,
+                    ).result()
+                except Exception as e:
+                    print(f"⚠️ Could not download photo for {sender}: {e}")
 
                 if avatar_path and os.path.exists(avatar_path):
                     p_avatar = doc.add_paragraph()
@@ -539,18 +803,46 @@ class TelegramLoginApp:
             if getattr(msg, "photo", None) or getattr(msg, "media", None):
                 try:
                     temp_file_base = os.path.join(temp_dir, f"media_{msg.id}")
-
-                    downloaded_path = asyncio.run_coroutine_threadsafe(
-                        self.client_manager.client.download_media(
-                            msg, file=temp_file_base
-                        ),
-                        self.loop,
-                    ).result()
+                    file_size = msg.file.size if msg.file else None
+                    is_large = bool(msg.document and file_size and file_size >= LARGE_MEDIA_THRESHOLD)
+                    downloaded_path = None
+
+                    # Большой файл имеет смысл качать, только если он попадёт в документ картинкой
+                    mime = (msg.file.mime_type or "") if msg.file else ""
+                    is_embeddable = (
+                        mime.startswith("image/")
+                        or (msg.file.ext or "").lower() in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
+                    ) if msg.file else False
+
+                    if is_large and not (self.embed_large_media.get() and is_embeddable):
+                        if mime.startswith("video/"):
+                            media_type_text = "[Video]"
+                        elif mime.startswith("audio/"):
+                            media_type_text = "[Voice Message/Audio]"
+                        else:
+                            media_type_text = "[File]"
+
+                    elif is_large:
+                        # Большие файлы качаем частями параллельно, с докачкой после обрыва
+                        large_path = os.path.join(DOWNLOADS_DIR, f"{dialog.id}_{msg.id}{msg.file.ext or ''}")
+                        downloaded_path = asyncio.run_coroutine_threadsafe(
+                            download_media_chunked(client, msg, large_path),
+                            self.loop,
+                        ).result()
+
+                    else:
+                        downloaded_path = asyncio.run_coroutine_threadsafe(
+                            client.download_media(
+                                msg, file=temp_file_base
+                            ),
+                            self.loop,
+                        ).result()
 
                     if downloaded_path and os.path.exists(downloaded_path):
                         ext = os.path.splitext(downloaded_path)[1].lower()
 
-                        if getattr(msg, "media", None) == MessageMediaType.STICKER:
+                        # Статичные стикеры (webp) вставляем картинкой, анимированные — текстом
+                        if msg.sticker and ext not in ['.webp', '.png']:
                             media_type_text = "[Sticker]"
                             os.remove(downloaded_path)
 
@@ -594,7 +886,7 @@ class TelegramLoginApp:
                     img_paragraph = doc.add_paragraph()
                     img_run = img_paragraph.add_run()
 
-                    is_sticker = getattr(msg, "media", None) == MessageMediaType.STICKER
+                    is_sticker = bool(msg.sticker)
                     width = Inches(1.5) if is_sticker else Inches(2.5)
 
                     img_run.add_picture(media_path_to_insert, width=width)
@@ -623,6 +915,10 @@ class TelegramLoginApp:
         os.makedirs("exports/docx", exist_ok=True)
         file_path = f"exports/docx/chat_{dialog.id}.docx"
         doc.save(file_path)
+        self.entity_cache.save()
+        search_index = self.get_search_index()
+        if search_index is not None:
+            search_index.add_messages(self.current_session, dialog.id, dialog.name, index_rows)
         print(f"✅ Exported to Word: {file_path}")
 
         # Чистим временные файлы
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import zipfile
+from datetime import datetime, timezone
+
+from app.utils.constants import ARCHIVES_DIR, ARCHIVE_PAGE_SIZE, LARGE_MEDIA_THRESHOLD
+
+ARCHIVE_FORMAT = 1
+
+
+class _HashingWriter:
+    """Обёртка над файлом: считает размер и SHA-256 всего, что через неё пишется"""
+
+    def __init__(self, dest):
+        self.dest = dest
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.dest.write(data)
+
+
+class _ArchiveWriter:
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path, "w", allowZip64=True)
+        self.files = {}
+
+    def write_bytes(self, name, data):
+        info = zipfile.ZipInfo(name, date_time=datetime.now().timetuple()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with self.zip.open(info, "w") as dest:
+            writer = _HashingWriter(dest)
+            writer.write(data)
+        self._record(name, writer)
+
+    async def write_stream(self, name, chunks):
+        # Медиа уже сжаты, поэтому кладём как есть и пишем сразу в архив, без temp-файлов
+        info = zipfile.ZipInfo(name, date_time=datetime.now().timetuple()[:6])
+        info.compress_type = zipfile.ZIP_STORED
+        writer = None
+        try:
+            with self.zip.open(info, "w", force_zip64=True) as dest:
+                writer = _HashingWriter(dest)
+                async for chunk in chunks:
+                    writer.write(chunk)
+        except Exception:
+            # Обрезанная запись остаётся в zip — в манифесте она должна быть помечена
+            if writer is not None:
+                self._record(name, writer, partial=True)
+            raise
+        self._record(name, writer)
+
+    def _record(self, name, writer, partial=False):
+        self.files[name] = {"sha256": writer.sha256.hexdigest(), "size": writer.size}
+        if partial:
+            self.files[name]["partial"] = True
+
+    def close(self):
+        self.zip.close()
+
+
+def _media_name(msg):
+    ext = msg.file.ext or ""
+    return f"media/{msg.id}{ext}"
+
+
+async def export_dialog_archive(client, dialog, limit, account, entity_cache,
+                                search_index=None, include_large_media=True):
+    """Потоково выгрузить диалог в ``exports/archives/chat_<id>.zip``.
+
+    Сообщения пишутся страницами в JSON Lines, медиа идут из Telegram сразу
+    в архив, последним пишется ``manifest.json`` с SHA-256 и связью
+    сообщение → файл. Возвращает путь к готовому архиву.
+    """
+    os.makedirs(ARCHIVES_DIR, exist_ok=True)
+    path = os.path.join(ARCHIVES_DIR, f"chat_{dialog.id}.zip")
+    part_path = path + ".part"
+
+    archive = _ArchiveWriter(part_path)
+    message_files = {}
+    message_count = 0
+    page = []
+
+    async def write_page():
+        nonlocal message_count
+        await entity_cache.resolve_senders(client, page)
+
+        records = []
+        index_rows = []
+        for msg in page:
+            sender = entity_cache.name(msg.sender_id)
+            text = msg.message or ""
+            record = {
+                "id": msg.id,
+                "date": msg.date.isoformat() if msg.date else None,
+                "sender_id": msg.sender_id,
+                "sender": sender,
+                "text": text,
+                "reply_to": msg.reply_to_msg_id,
+                "service": getattr(msg, "action", None) is not None,
+                "media": None,
+            }
+
+            if msg.file is not None:
+                size = msg.file.size or 0
+                if include_large_media or size < LARGE_MEDIA_THRESHOLD:
+                    name = _media_name(msg)
+                    try:
+                        chunks = client.iter_download(msg.document or msg.photo, file_size=msg.file.size)
+                        await archive.write_stream(name, chunks)
+                        record["media"] = name
+                        message_files[str(msg.id)] = name
+                    except Exception as e:
+                        print(f"⚠️ Could not download media {msg.id}: {e}")
+                        record["media_error"] = str(e)
+                        if name in archive.files:
+                            record["media"] = name
+                            message_files[str(msg.id)] = name
+                else:
+                    record["media_skipped"] = size
+
+            records.append(record)
+            if text.strip():
+                index_rows.append((msg.id, sender, record["date"], text))
+
+        part_name = f"messages/{message_count // ARCHIVE_PAGE_SIZE + 1:05d}.jsonl"
+        archive.write_bytes(
+            part_name,
+            "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8"),
+        )
+        if search_index is not None:
+            search_index.add_messages(account, dialog.id, dialog.name, index_rows)
+
+        message_count += len(page)
+        page.clear()
+
+    try:
+        # Как и get_messages — от новых к старым; отправители резолвятся пачкой на страницу
+        async for msg in client.iter_messages(dialog, limit=limit):
+            page.append(msg)
+            if len(page) >= ARCHIVE_PAGE_SIZE:
+                await write_page()
+        if page:
+            await write_page()
+
+        manifest = {
+            "format": ARCHIVE_FORMAT,
+            "account": account,
+            "dialog_id": dialog.id,
+            "dialog_name": dialog.name,
+            "exported_at": datetime.now(timezone.utc).isoformat(),
+            "order": "newest_first",
+            "message_count": message_count,
+            "files": archive.files,
+            "messages": message_files,
+        }
+        archive.write_bytes("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+    except BaseException:
+        archive.close()
+        os.remove(part_path)
+        raise
+
+    archive.close()
+
+    entity_cache.save()
+    os.replace(part_path, path)
+    return path
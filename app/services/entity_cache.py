@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+
+from telethon.errors import RPCError
+from telethon.utils import get_display_name, get_peer_id
+
+from app.utils.constants import ENTITY_CACHE_DIR, ENTITY_BATCH_SIZE, SENDER_IMAGES_DIR
+
+
+class EntityCache:
+    """Кэш пользователей/чатов сессии: имена, username и id фото.
+
+    Хранится в JSON рядом с сессиями, ключи — марк-id (как ``msg.sender_id``
+    и ``dialog.id``). Аватарки отправителей лежат в отдельной папке сессии.
+    """
+
+    def __init__(self, session_name):
+        self.path = os.path.join(ENTITY_CACHE_DIR, f"{session_name}.json")
+        self.images_dir = os.path.join(SENDER_IMAGES_DIR, session_name)
+        os.makedirs(self.images_dir, exist_ok=True)
+        # Кэш пишут и GUI-поток, и event loop (live-режим)
+        self.lock = threading.RLock()
+        self.entities = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save(self):
+        # Пишем во временный файл и подменяем, чтобы не оставить битый JSON
+        tmp_path = self.path + ".tmp"
+        with self.lock:
+            data = json.dumps(self.entities, ensure_ascii=False, indent=2)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+
+    def get(self, peer_id):
+        if peer_id is None:
+            return None
+        return self.entities.get(str(peer_id))
+
+    def name(self, peer_id, default="Unknown"):
+        info = self.get(peer_id)
+        return (info.get("name") or default) if info else default
+
+    def add(self, entity):
+        """Запомнить сущность Telethon (User/Chat/Channel) и вернуть запись"""
+        if entity is None:
+            return None
+
+        key = str(get_peer_id(entity))
+        photo = getattr(entity, "photo", None)
+        with self.lock:
+            info = self.entities.get(key, {})
+            info.update({
+                "name": get_display_name(entity),
+                "username": getattr(entity, "username", None),
+                "photo_id": getattr(photo, "photo_id", None),
+            })
+            self.entities[key] = info
+        return info
+
+    async def resolve(self, client, peers):
+        """Резолв пачками через ``get_entity`` (по ENTITY_BATCH_SIZE за запрос)"""
+        peers = list(peers)
+        for start in range(0, len(peers), ENTITY_BATCH_SIZE):
+            chunk = peers[start:start + ENTITY_BATCH_SIZE]
+            try:
+                entities = await client.get_entity(chunk)
+            except (ValueError, TypeError, RPCError):
+                # Один неизвестный/закрытый peer роняет всю пачку — повторяем по одному,
+                # не найденные останутся "Unknown", как и раньше
+                entities = []
+                for peer in chunk:
+                    try:
+                        entities.append(await client.get_entity(peer))
+                    except Exception as e:
+                        print(f"⚠️ Could not resolve entity {peer}: {e}")
+
+            for entity in entities:
+                self.add(entity)
+
+    async def resolve_senders(self, client, messages):
+        """Заполнить кэш отправителями сообщений одним проходом"""
+        pending = {}
+        for msg in messages:
+            if msg.sender is not None:
+                self.add(msg.sender)
+            elif msg.sender_id is not None and self.get(msg.sender_id) is None:
+                pending[msg.sender_id] = getattr(msg, "input_sender", None) or msg.sender_id
+
+        if pending:
+            await self.resolve(client, pending.values())
+        self.save()
+
+    async def download_avatar(self, client, peer_id):
+        """Путь к аватарке; качаем заново только при смене id фото"""
+        info = self.get(peer_id)
+        if not info:
+            return None
+
+        old_path = info.get("avatar")
+        if not info.get("photo_id"):
+            # Фото удалено — убираем и старый файл
+            if old_path and os.path.exists(old_path):
+                os.remove(old_path)
+            with self.lock:
+                info["avatar"] = None
+            return None
+
+        path = os.path.join(self.images_dir, f"{peer_id}_{info['photo_id']}.jpg")
+        if not os.path.exists(path):
+            path = await client.download_profile_photo(peer_id, file=path)
+            if not path:
+                return None
+
+        if old_path and old_path != path and os.path.exists(old_path):
+            os.remove(old_path)
+        with self.lock:
+            info["avatar"] = path
+        return path
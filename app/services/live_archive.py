@@ -0,0 +1,197 @@
+import asyncio
+import os
+import sqlite3
+
+from telethon import events
+
+from app.utils.constants import LIVE_ARCHIVE_DIR, LIVE_FLUSH_INTERVAL, LIVE_BATCH_SIZE, CHANNEL_ID_BOUND
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    dialog_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    sender_id INTEGER,
+    sender_name TEXT,
+    date TEXT,
+    edit_date TEXT,
+    text TEXT,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dialog_id, message_id)
+)
+"""
+
+
+class LiveArchive:
+    """Live-режим: новые сообщения выбранных диалогов в локальный SQLite-архив.
+
+    Новые, изменённые и удалённые сообщения копятся в памяти и пишутся одной
+    транзакцией раз в ``LIVE_FLUSH_INTERVAL`` секунд (или при ``LIVE_BATCH_SIZE``
+    изменений), без повторного сканирования истории.
+    """
+
+    def __init__(self, session_name, entity_cache=None, search_index=None):
+        self.session_name = session_name
+        self.path = os.path.join(LIVE_ARCHIVE_DIR, f"{session_name}.sqlite")
+        self.entity_cache = entity_cache
+        self.search_index = search_index
+        self.dialog_ids = set()
+        self.client = None
+        self.db = None
+        self.pending = {}
+        self.pending_deletes = []
+        self.flush_event = None
+        self.flush_task = None
+
+    @property
+    def running(self):
+        return self.client is not None
+
+    async def start(self, client):
+        self.client = client
+        self.db = sqlite3.connect(self.path)
+        self.db.execute(SCHEMA)
+        self.db.commit()
+        self.flush_event = asyncio.Event()
+
+        client.add_event_handler(self._on_message, events.NewMessage())
+        client.add_event_handler(self._on_message, events.MessageEdited())
+        client.add_event_handler(self._on_deleted, events.MessageDeleted())
+        self.flush_task = asyncio.ensure_future(self._flush_loop())
+
+    async def stop(self):
+        if not self.running:
+            return
+
+        self.client.remove_event_handler(self._on_message)
+        self.client.remove_event_handler(self._on_deleted)
+        self.flush_task.cancel()
+        try:
+            await self.flush_task
+        except asyncio.CancelledError:
+            pass
+
+        try:
+            self.flush()
+        finally:
+            self.db.close()
+            self.db = None
+            self.client = None
+
+    def watch(self, dialog_id):
+        self.dialog_ids.add(dialog_id)
+
+    def unwatch(self, dialog_id):
+        self.dialog_ids.discard(dialog_id)
+
+    # -------------------- Event handlers --------------------
+    async def _on_message(self, event):
+        if event.chat_id not in self.dialog_ids:
+            return
+
+        msg = event.message
+        sender_name = None
+        if self.entity_cache is not None:
+            if msg.sender is not None:
+                self.entity_cache.add(msg.sender)
+            sender_name = self.entity_cache.name(msg.sender_id, None)
+
+        # Правки одного сообщения внутри пачки схлопываются в последнюю версию
+        self.pending[(event.chat_id, msg.id)] = (
+            event.chat_id,
+            msg.id,
+            msg.sender_id,
+            sender_name,
+            msg.date.isoformat() if msg.date else None,
+            msg.edit_date.isoformat() if msg.edit_date else None,
+            msg.message or "",
+        )
+        self._maybe_flush()
+
+    async def _on_deleted(self, event):
+        # Для личных чатов и обычных групп Telegram не сообщает chat_id
+        if event.chat_id is not None and event.chat_id not in self.dialog_ids:
+            return
+
+        for message_id in event.deleted_ids:
+            self.pending_deletes.append((event.chat_id, message_id))
+        self._maybe_flush()
+
+    # -------------------- Group commits --------------------
+    def _maybe_flush(self):
+        if len(self.pending) + len(self.pending_deletes) >= LIVE_BATCH_SIZE:
+            self.flush_event.set()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.flush_event.wait(), LIVE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # Задача не должна умирать, иначе обновления копятся в памяти навсегда
+                print(f"⚠️ Live archive flush failed: {e}")
+
+    def flush(self):
+        if not self.pending and not self.pending_deletes:
+            return
+
+        rows, self.pending = list(self.pending.values()), {}
+        deletes, self.pending_deletes = self.pending_deletes, []
+
+        try:
+            self._commit(rows, deletes)
+        except sqlite3.Error:
+            # Возвращаем пачку в буфер; более свежие правки из буфера важнее
+            for row in rows:
+                self.pending.setdefault((row[0], row[1]), row)
+            self.pending_deletes[:0] = deletes
+            raise
+
+        if self.search_index is not None:
+            self._index(rows, deletes)
+        if self.entity_cache is not None:
+            self.entity_cache.save()
+        print(f"💾 Live archive: {len(rows)} messages, {len(deletes)} deletions")
+
+    def _commit(self, rows, deletes):
+        with self.db:
+            self.db.executemany(
+                """
+                INSERT INTO messages (dialog_id, message_id, sender_id, sender_name, date, edit_date, text)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (dialog_id, message_id) DO UPDATE SET
+                    sender_name = COALESCE(excluded.sender_name, sender_name),
+                    edit_date = excluded.edit_date,
+                    text = excluded.text
+                """,
+                rows,
+            )
+            for chat_id, message_id in deletes:
+                if chat_id is not None:
+                    self.db.execute(
+                        "UPDATE messages SET deleted = 1 WHERE dialog_id = ? AND message_id = ?",
+                        (chat_id, message_id),
+                    )
+                else:
+                    # id сообщений вне каналов уникальны в пределах аккаунта
+                    self.db.execute(
+                        "UPDATE messages SET deleted = 1 WHERE dialog_id > ? AND message_id = ?",
+                        (CHANNEL_ID_BOUND, message_id),
+                    )
+
+    def _index(self, rows, deletes):
+        by_dialog = {}
+        for dialog_id, message_id, sender_id, sender_name, date, edit_date, text in rows:
+            if text.strip():
+                by_dialog.setdefault(dialog_id, []).append((message_id, sender_name, date, text))
+
+        for dialog_id, index_rows in by_dialog.items():
+            dialog_name = self.entity_cache.name(dialog_id, None) if self.entity_cache is not None else None
+            self.search_index.add_messages(self.session_name, dialog_id, dialog_name, index_rows)
+
+        # Удалённые сообщения не должны находиться поиском
+        if deletes:
+            self.search_index.remove_messages(self.session_name, deletes)
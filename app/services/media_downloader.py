@@ -0,0 +1,102 @@
+import asyncio
+import json
+import math
+import os
+
+from app.utils.constants import DOWNLOAD_PART_SIZE, DOWNLOAD_WORKERS
+
+# Максимальный размер одного запроса upload.getFile
+REQUEST_SIZE = 512 * 1024
+
+
+def _load_progress(progress_path, file_id, size):
+    try:
+        with open(progress_path, "r", encoding="utf-8") as f:
+            progress = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return set()
+
+    # Другой файл или другой размер части — начинаем заново
+    if (progress.get("file_id") != file_id or progress.get("size") != size
+            or progress.get("part_size") != DOWNLOAD_PART_SIZE):
+        return set()
+    return set(progress.get("done", []))
+
+
+def _save_progress(progress_path, file_id, size, done):
+    with open(progress_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "file_id": file_id,
+            "size": size,
+            "part_size": DOWNLOAD_PART_SIZE,
+            "done": sorted(done),
+        }, f)
+
+
+async def download_media_chunked(client, msg, path, workers=DOWNLOAD_WORKERS):
+    """Скачать документ сообщения параллельными диапазонами с докачкой.
+
+    Данные пишутся в заранее выделенный ``<path>.part``, готовые части
+    отмечаются в ``<path>.progress``. Возвращает ``path`` после проверки размера.
+    """
+    document = msg.document
+    size = msg.file.size
+    file_id = document.id
+    part_path = path + ".part"
+    progress_path = path + ".progress"
+
+    done = _load_progress(progress_path, file_id, size)
+    if not os.path.exists(part_path) or os.path.getsize(part_path) != size:
+        done = set()
+        with open(part_path, "wb") as f:
+            f.truncate(size)
+
+    parts = math.ceil(size / DOWNLOAD_PART_SIZE)
+    semaphore = asyncio.Semaphore(workers)
+
+    with open(part_path, "r+b") as f:
+        async def fetch_part(index):
+            async with semaphore:
+                start = index * DOWNLOAD_PART_SIZE
+                end = min(start + DOWNLOAD_PART_SIZE, size)
+                position = start
+
+                async for chunk in client.iter_download(
+                    document,
+                    offset=start,
+                    limit=math.ceil((end - start) / REQUEST_SIZE),
+                    request_size=REQUEST_SIZE,
+                    file_size=size,
+                ):
+                    chunk = chunk[:end - position]
+                    # Между seek и write нет await, поэтому части не перемешиваются
+                    f.seek(position)
+                    f.write(chunk)
+                    position += len(chunk)
+
+                if position != end:
+                    raise IOError(f"Part {index} of {path} is incomplete: {position - start}/{end - start} bytes")
+
+                f.flush()
+                os.fsync(f.fileno())
+                done.add(index)
+                _save_progress(progress_path, file_id, size, done)
+
+        tasks = [asyncio.ensure_future(fetch_part(i)) for i in range(parts) if i not in done]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Останавливаем остальные части до закрытия файла, готовые уже в .progress
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    actual_size = os.path.getsize(part_path)
+    if len(done) != parts or actual_size != size:
+        raise IOError(f"Downloaded size mismatch for {path}: {actual_size} != {size}")
+
+    os.replace(part_path, path)
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+    return path
@@ -0,0 +1,146 @@
+import sqlite3
+from contextlib import closing
+
+from app.utils.constants import SEARCH_INDEX_FILE, CHANNEL_ID_BOUND
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    account TEXT NOT NULL,
+    dialog_id INTEGER NOT NULL,
+    dialog_name TEXT,
+    message_id INTEGER NOT NULL,
+    sender TEXT,
+    date TEXT,
+    text TEXT,
+    UNIQUE (account, dialog_id, message_id)
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, sender, content='messages', content_rowid='id'
+);
+
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, text, sender) VALUES (new.id, new.text, new.sender);
+END;
+
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text, sender) VALUES ('delete', old.id, old.text, old.sender);
+END;
+
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text, sender) VALUES ('delete', old.id, old.text, old.sender);
+    INSERT INTO messages_fts (rowid, text, sender) VALUES (new.id, new.text, new.sender);
+END;
+"""
+
+
+def to_fts_query(query):
+    """Безопасный FTS5-запрос из ввода: все слова, последнее — как префикс"""
+    words = ['"' + word.replace('"', '""') + '"' for word in query.split()]
+    if not words:
+        return None
+    words[-1] += "*"
+    return " ".join(words)
+
+
+class SearchIndex:
+    """Полнотекстовый индекс по выгруженным сообщениям всех аккаунтов и диалогов"""
+
+    def __init__(self, path=SEARCH_INDEX_FILE):
+        self.path = path
+        with closing(self._connect()) as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        # Короткие соединения: индекс пишется и из GUI-потока, и из event loop
+        return sqlite3.connect(self.path)
+
+    def add_messages(self, account, dialog_id, dialog_name, rows):
+        """Добавить/обновить строки ``(message_id, sender, date, text)`` одной транзакцией"""
+        with closing(self._connect()) as db, db:
+            db.executemany(
+                """
+                INSERT INTO messages (account, dialog_id, dialog_name, message_id, sender, date, text)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (account, dialog_id, message_id) DO UPDATE SET
+                    dialog_name = excluded.dialog_name,
+                    sender = excluded.sender,
+                    text = excluded.text
+                WHERE text IS NOT excluded.text OR sender IS NOT excluded.sender
+                    OR dialog_name IS NOT excluded.dialog_name
+                """,
+                [(account, dialog_id, dialog_name, *row) for row in rows],
+            )
+
+    def remove_messages(self, account, deletes):
+        """Удалить пары ``(dialog_id, message_id)``; dialog_id может быть None"""
+        with closing(self._connect()) as db, db:
+            for dialog_id, message_id in deletes:
+                if dialog_id is not None:
+                    db.execute(
+                        "DELETE FROM messages WHERE account = ? AND dialog_id = ? AND message_id = ?",
+                        (account, dialog_id, message_id),
+                    )
+                else:
+                    # Без chat_id: id сообщений вне каналов уникальны в пределах аккаунта
+                    db.execute(
+                        "DELETE FROM messages WHERE account = ? AND dialog_id > ? AND message_id = ?",
+                        (account, CHANNEL_ID_BOUND, message_id),
+                    )
+
+    def search(self, query, limit=50, account=None, dialog_id=None):
+        """Найденные сообщения по релевантности, с подсвеченным фрагментом текста"""
+        fts_query = to_fts_query(query)
+        if fts_query is None:
+            return []
+
+        sql = """
+            SELECT m.account, m.dialog_id, m.dialog_name, m.message_id, m.sender, m.date,
+                   snippet(messages_fts, 0, '[', ']', '…', 12), bm25(messages_fts)
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            WHERE messages_fts MATCH ?
+        """
+        params = [fts_query]
+        if account is not None:
+            sql += " AND m.account = ?"
+            params.append(account)
+        if dialog_id is not None:
+            sql += " AND m.dialog_id = ?"
+            params.append(dialog_id)
+        sql += " ORDER BY bm25(messages_fts) LIMIT ?"
+        params.append(limit)
+
+        with closing(self._connect()) as db:
+            rows = db.execute(sql, params).fetchall()
+
+        return [
+            {
+                "account": account, "dialog_id": dialog_id, "dialog_name": dialog_name,
+                "message_id": message_id, "sender": sender, "date": date,
+                "snippet": snippet, "rank": rank,
+            }
+            for account, dialog_id, dialog_name, message_id, sender, date, snippet, rank in rows
+        ]
+
+    def context(self, account, dialog_id, message_id, around=2):
+        """Соседние сообщения по порядку: ``(message_id, sender, date, text)``"""
+        with closing(self._connect()) as db:
+            before = db.execute(
+                """
+                SELECT message_id, sender, date, text FROM messages
+                WHERE account = ? AND dialog_id = ? AND message_id < ?
+                ORDER BY message_id DESC LIMIT ?
+                """,
+                (account, dialog_id, message_id, around),
+            ).fetchall()
+            rest = db.execute(
+                """
+                SELECT message_id, sender, date, text FROM messages
+                WHERE account = ? AND dialog_id = ? AND message_id >= ?
+                ORDER BY message_id LIMIT ?
+                """,
+                (account, dialog_id, message_id, around + 1),
+            ).fetchall()
+        return list(reversed(before)) + rest
@@ -1,12 +1,19 @@
+import asyncio
 import os
+import shutil
 from app.utils.file_utils import load_meta, save_meta
-from app.utils.constants import SESSIONS_DIR
+from app.utils.constants import SESSIONS_DIR, ENTITY_CACHE_DIR, IMAGES_DIR, SENDER_IMAGES_DIR, SESSION_CHECK_TIMEOUT
 
 def remove_session(session_name: str):
     path = os.path.join(SESSIONS_DIR, f"{session_name}.session")
     if os.path.exists(path):
         os.remove(path)
 
+    cache_path = os.path.join(ENTITY_CACHE_DIR, f"{session_name}.json")
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+    shutil.rmtree(os.path.join(SENDER_IMAGES_DIR, session_name), ignore_errors=True)
+
     meta = load_meta()
     if f"{session_name}.session" in meta:
         info = meta.pop(f"{session_name}.session")
@@ -14,3 +21,59 @@ def remove_session(session_name: str):
         if avatar_path and os.path.exists(avatar_path):
             os.remove(avatar_path)
         save_meta(meta)
+
+def avatar_is_stale(info: dict, photo_id) -> bool:
+    """Аватар надо качать заново, только если сменилось фото или пропал файл"""
+    avatar_path = info.get("avatar")
+    return photo_id != info.get("photo_id") or not (avatar_path and os.path.exists(avatar_path))
+
+async def check_session(session_name: str, info: dict, loop) -> dict:
+    """Проверить сохранённую сессию: соединение, авторизацию и актуальность аватара"""
+    from telethon import TelegramClient
+
+    client = TelegramClient(os.path.join(SESSIONS_DIR, session_name), info["api_id"], info["api_hash"], loop=loop)
+    result = {"status": "offline", "avatar": info.get("avatar"), "photo_id": info.get("photo_id")}
+
+    async def run():
+        await client.connect()
+        if not await client.is_user_authorized():
+            result["status"] = "unauthorized"
+            return
+
+        me = await client.get_me()
+        result["status"] = "ok"
+        photo_id = getattr(me.photo, "photo_id", None)
+        if photo_id is None:
+            result["avatar"] = None
+        elif avatar_is_stale(info, photo_id):
+            path = os.path.join(IMAGES_DIR, f"{session_name}.png")
+            result["avatar"] = await client.download_profile_photo(me, file=path)
+        result["photo_id"] = photo_id
+
+    try:
+        await asyncio.wait_for(run(), SESSION_CHECK_TIMEOUT)
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        try:
+            await client.disconnect()
+        except Exception:
+            pass
+    return result
+
+def update_session_meta(session_name: str, result: dict):
+    if result["status"] != "ok":
+        return
+
+    meta = load_meta()
+    info = meta.get(f"{session_name}.session")
+    if info is None:
+        return
+
+    old_avatar = info.get("avatar")
+    if result["avatar"] is None and old_avatar and os.path.exists(old_avatar):
+        os.remove(old_avatar)
+
+    info["avatar"] = result["avatar"]
+    info["photo_id"] = result["photo_id"]
+    save_meta(meta)
@@ -1,15 +1,18 @@
 import asyncio
-from telethon import TelegramClient
 from app.utils.constants import SESSIONS_DIR, IMAGES_DIR
 
 class TelegramClientManager:
     def __init__(self, loop):
         self.loop = loop
         self.client = None
+        self.me = None
 
     def connect(self, session_name, api_id, api_hash):
-        # создаём клиент, используя тот же event loop
+        # создаём клиент, используя тот же event loop; telethon грузим только здесь
+        from telethon import TelegramClient
+
         self.client = TelegramClient(f"{SESSIONS_DIR}/{session_name}", api_id, api_hash, loop=self.loop)
+        self.me = None
         future = asyncio.run_coroutine_threadsafe(self.client.connect(), self.loop)
         future.result()
         return self.client
@@ -26,6 +29,7 @@ class TelegramClientManager:
             except Exception:
                 pass
             self.client = None
+            self.me = None
 
     def send_code(self, phone):
         future = asyncio.run_coroutine_threadsafe(self.client.send_code_request(phone), self.loop)
@@ -36,15 +40,20 @@ class TelegramClientManager:
             self.client.sign_in(phone=phone, code=code, phone_code_hash=phone_code_hash),
             self.loop
         )
+        self.me = None
         return future.result()
 
     def sign_in_2fa(self, password):
         future = asyncio.run_coroutine_threadsafe(self.client.sign_in(password=password), self.loop)
+        self.me = None
         return future.result()
 
-    def get_me(self):
-        future = asyncio.run_coroutine_threadsafe(self.client.get_me(), self.loop)
-        return future.result()
+    def get_me(self, refresh=False):
+        # кэшируем до переподключения, чтобы не дёргать get_me на каждый экспорт
+        if self.me is None or refresh:
+            future = asyncio.run_coroutine_threadsafe(self.client.get_me(), self.loop)
+            self.me = future.result()
+        return self.me
 
     async def get_dialogs(self, limit=50):
         dialogs = []
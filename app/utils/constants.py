@@ -2,8 +2,28 @@ import os
 
 SESSIONS_DIR = "sessions"
 IMAGES_DIR = os.path.join("images", "profiles")
+SENDER_IMAGES_DIR = os.path.join("images", "senders")
 META_FILE = os.path.join(SESSIONS_DIR, "meta.json")
+ENTITY_CACHE_DIR = os.path.join(SESSIONS_DIR, "entities")
+ENTITY_BATCH_SIZE = 100
+DOWNLOADS_DIR = "downloads"
+LARGE_MEDIA_THRESHOLD = 10 * 1024 * 1024
+DOWNLOAD_PART_SIZE = 4 * 1024 * 1024
+DOWNLOAD_WORKERS = 4
+LIVE_ARCHIVE_DIR = os.path.join("exports", "live")
+LIVE_FLUSH_INTERVAL = 5
+LIVE_BATCH_SIZE = 500
+# Марк-идентификаторы каналов/супергрупп начинаются с -100...
+CHANNEL_ID_BOUND = -1000000000000
+SEARCH_INDEX_FILE = os.path.join("exports", "search.sqlite")
+ARCHIVES_DIR = os.path.join("exports", "archives")
+ARCHIVE_PAGE_SIZE = 500
+SESSION_CHECK_TIMEOUT = 10
 AVATAR_SIZE = 50
 
 os.makedirs(SESSIONS_DIR, exist_ok=True)
-os.makedirs(IMAGES_DIR, exist_ok=True)
\ No newline at end of file
+os.makedirs(IMAGES_DIR, exist_ok=True)
+os.makedirs(SENDER_IMAGES_DIR, exist_ok=True)
+os.makedirs(ENTITY_CACHE_DIR, exist_ok=True)
+os.makedirs(DOWNLOADS_DIR, exist_ok=True)
+os.makedirs(LIVE_ARCHIVE_DIR, exist_ok=True)
@@ -0,0 +1,115 @@
+"""Бенчмарк запуска: время до первого окна и время импорта модулей.
+
+Каждый замер — в новом интерпретаторе, то есть холодный старт:
+
+    python benchmarks/startup.py --runs 5 --max-window-ms 800
+
+Код выхода ненулевой, если медиана до первого окна больше ``--max-window-ms``.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Модули, за которыми следим: код приложения и тяжёлые зависимости
+WATCHED_PREFIXES = ("app", "main", "tkinter", "PIL", "telethon", "docx")
+
+# Загружаются только при первом использовании функции, поэтому меряются отдельно
+DEFERRED_MODULES = (
+    "app.services.archive_export",
+    "app.services.entity_cache",
+    "app.services.live_archive",
+    "app.services.media_downloader",
+    "app.services.search_index",
+    "docx",
+)
+
+WINDOW_SNIPPET = """
+import sys, time
+start = float(sys.argv[1])
+import tkinter as tk
+from app.gui.login_app import TelegramLoginApp
+# Фоновые проверки сессий ходят в сеть — в замере первого окна они не нужны
+TelegramLoginApp.start_session_checks = lambda self, sessions, meta: None
+root = tk.Tk()
+app = TelegramLoginApp(root)
+root.update_idletasks()
+root.update()
+print(f"{(time.time() - start) * 1000:.1f}")
+root.destroy()
+"""
+
+
+def measure_window_ms():
+    start = time.time()
+    result = subprocess.run(
+        [sys.executable, "-c", WINDOW_SNIPPET, str(start)],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "window run failed")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure_import_times(module_name):
+    """``{модуль: cumulative_ms}`` из ``python -X importtime``"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = (part.strip() for part in line[len("import time:"):].split("|"))
+        if module.split(".")[0] in WATCHED_PREFIXES:
+            times[module] = int(cumulative) / 1000
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-window-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    try:
+        startup_imports = measure_import_times("app.gui.login_app")
+        deferred_imports = {name: measure_import_times(name)[name] for name in DEFERRED_MODULES}
+    except RuntimeError as e:
+        print(f"❌ Import failed: {e}")
+        return 1
+
+    print("Startup imports (cumulative, ms):")
+    for module, ms in sorted(startup_imports.items(), key=lambda item: -item[1]):
+        print(f"  {ms:8.1f}  {module}")
+
+    print("Deferred imports (cumulative, ms):")
+    for module, ms in deferred_imports.items():
+        print(f"  {ms:8.1f}  {module}")
+
+    try:
+        samples = [measure_window_ms() for _ in range(args.runs)]
+    except RuntimeError as e:
+        print(f"⚠️ Could not open a window (no display?): {e}")
+        # С порогом без замера гейт не должен проходить молча
+        return 1 if args.max_window_ms is not None else 0
+
+    median = statistics.median(samples)
+    print(f"First window: median {median:.1f} ms, min {min(samples):.1f} ms, max {max(samples):.1f} ms")
+
+    if args.max_window_ms is not None and median > args.max_window_ms:
+        print(f"❌ Startup regression: {median:.1f} ms > {args.max_window_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())